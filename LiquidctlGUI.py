@@ -1,8 +1,140 @@
 import sys
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSlider, QComboBox, QColorDialog, QTextEdit
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, QRunnable, QThreadPool, pyqtSignal
 import subprocess
 
+try:
+    from liquidctl import find_liquidctl_devices
+    HAVE_LIQUIDCTL_API = True
+except ImportError:
+    HAVE_LIQUIDCTL_API = False
+
+DEVICE_MATCH = "Corsair"  # Only devices whose description contains this are controlled
+FAN_CHANNEL = "fan1"  # Replace with the appropriate fan channel for your setup
+COMMAND_TIMEOUT = 10  # Seconds before a hung liquidctl command is given up on
+
+# liquidctl command templates, built once; per-call arguments are appended
+LIST_COMMAND = ("liquidctl", "list")
+STATUS_COMMAND = ("liquidctl", "status")
+FAN_SPEED_COMMAND = ("liquidctl", "--match", DEVICE_MATCH, "set", FAN_CHANNEL, "speed")
+PUMP_SPEED_COMMAND = ("liquidctl", "--match", DEVICE_MATCH, "set", "pump", "speed")
+RGB_MODE_COMMAND = ("liquidctl", "set", "rgb", "mode")
+RGB_COLOR_COMMAND = ("liquidctl", "set", "rgb", "color")
+
+class LiquidctlBridge:
+    """Talks to liquidctl devices in-process and keeps the matched one connected between commands.
+
+    Only used from the command pool's single thread, so device access is never concurrent.
+    """
+
+    def __init__(self):
+        self.device = None  # Connected device matching DEVICE_MATCH
+
+    @staticmethod
+    def matches(dev):
+        return DEVICE_MATCH.lower() in dev.description.lower()
+
+    @staticmethod
+    def status_lines(dev):
+        lines = [dev.description]
+        for key, value, unit in dev.get_status():
+            lines.append(f"  {key}: {value} {unit}")
+        return lines
+
+    def is_connected(self, dev):
+        return self.device is not None and (dev.bus, dev.address) == (self.device.bus, self.device.address)
+
+    def matching_device(self):
+        # Like the CLI's --match, act only when exactly one device matches
+        if self.device is None:
+            devices = [dev for dev in find_liquidctl_devices() if self.matches(dev)]
+            if not devices:
+                raise RuntimeError(f"no device matching '{DEVICE_MATCH}' found")
+            if len(devices) > 1:
+                raise RuntimeError(f"{len(devices)} devices match '{DEVICE_MATCH}', make DEVICE_MATCH more specific")
+            devices[0].connect()  # Only cached once this succeeds, so a failure is retried next time
+            self.device = devices[0]
+        return self.device
+
+    def list_devices(self):
+        # Listing only reads descriptions, no device is opened
+        return "\n".join(f"Device #{i}: {dev.description}" for i, dev in enumerate(find_liquidctl_devices()))
+
+    def get_status(self):
+        lines = []
+        for dev in find_liquidctl_devices():
+            if self.is_connected(dev):
+                lines += self.status_lines(self.device)
+                continue
+            # Devices not already open are opened just long enough to read their status
+            try:
+                with dev.connect():
+                    lines += self.status_lines(dev)
+            except Exception as e:  # liquidctl drivers raise a mix of USB, HID and driver errors
+                lines.append(f"{dev.description}: {e}")
+        return "\n".join(lines)
+
+    def set_fixed_speed(self, channel, duty):
+        self.matching_device().set_fixed_speed(channel, duty)
+        return ""
+
+    def disconnect(self):
+        if self.device is not None:
+            try:
+                self.device.disconnect()
+            except OSError:
+                pass
+        self.device = None
+
+class CommandSignals(QObject):
+    finished = pyqtSignal(str)
+
+class CommandWorker(QRunnable):
+    """Runs a liquidctl command in the background and reports the log message.
+
+    When bridge and api_call are given the call goes through the liquidctl API
+    instead of spawning the command line tool.
+    """
+
+    def __init__(self, command, success_message, error_message, bridge=None, api_call=None):
+        super().__init__()
+        self.command = command
+        self.success_message = success_message
+        self.error_message = error_message
+        self.bridge = bridge
+        self.api_call = api_call
+        self.signals = CommandSignals()
+
+    def run(self):
+        if self.bridge is not None and self.api_call is not None:
+            message = self.run_api()
+        else:
+            if self.bridge is not None:
+                # Some drivers only allow one process to claim the device, so let the CLI have it
+                self.bridge.disconnect()
+            message = self.run_cli()
+        self.signals.finished.emit(message)
+
+    def run_api(self):
+        try:
+            return f"{self.success_message}:\n{self.api_call(self.bridge)}"
+        except Exception as e:  # liquidctl drivers raise a mix of USB, HID and driver errors
+            # Drop the connections so the next command rediscovers the devices
+            self.bridge.disconnect()
+            return f"{self.error_message}: {e}"
+
+    def run_cli(self):
+        try:
+            result = subprocess.run(self.command, capture_output=True, text=True, check=True, timeout=COMMAND_TIMEOUT)
+            message = f"{self.success_message}:\n{result.stdout}"
+        except FileNotFoundError:
+            message = "Error: 'liquidctl' command not found. Please make sure it is installed."
+        except subprocess.CalledProcessError as e:
+            message = f"{self.error_message}: {e.stderr}"
+        except subprocess.TimeoutExpired:
+            message = f"{self.error_message}: liquidctl did not respond within {COMMAND_TIMEOUT} seconds"
+        return message
+
 class LiquidCtlGUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -10,6 +142,23 @@ class LiquidCtlGUI(QMainWindow):
         self.setWindowTitle("LiquidCTL GUI")
         self.setGeometry(100, 100, 800, 600)
 
+        # Maximum number of lines kept in the log output
+        self.log_max_lines = 1000  # Adjust as needed
+
+        # Run liquidctl commands one at a time off the UI thread so the window
+        # stays responsive and commands reach the device in the order issued
+        self.command_pool = QThreadPool()
+        self.command_pool.setMaxThreadCount(1)
+
+        # How long closing the window waits for queued commands (in milliseconds)
+        self.close_timeout = 3000  # Adjust as needed
+
+        # Use the liquidctl Python API when it's installed, the CLI otherwise
+        self.bridge = LiquidctlBridge() if HAVE_LIQUIDCTL_API else None
+
+        # Slider adjustment delay (in milliseconds), shared by fan and pump
+        self.slider_adjustment_delay = 500  # Adjust as needed
+
         self.initUI()
 
         # Timer for delayed pump speed command
@@ -17,17 +166,11 @@ class LiquidCtlGUI(QMainWindow):
         self.pump_command_timer.setSingleShot(True)
         self.pump_command_timer.timeout.connect(self.send_pump_speed_command)
 
-        # Pump speed adjustment delay (in milliseconds)
-        self.pump_adjustment_delay = 500  # Adjust as needed
-
         # Timer for delayed fan speed command
         self.fan_command_timer = QTimer()
         self.fan_command_timer.setSingleShot(True)
         self.fan_command_timer.timeout.connect(self.send_fan_speed_command)
 
-        # Fan speed adjustment delay (in milliseconds)
-        self.fan_adjustment_delay = 500  # Adjust as needed
-
     def initUI(self):
         main_widget = QWidget()
         main_layout = QVBoxLayout()
@@ -54,6 +197,7 @@ class LiquidCtlGUI(QMainWindow):
         self.fan_slider.setRange(0, 100)
         self.fan_slider.setValue(50)
         self.fan_slider.valueChanged.connect(self.adjust_fan_speed)
+        self.fan_slider.sliderReleased.connect(self.release_fan_slider)
         control_layout.addWidget(self.fan_slider)
 
         self.pump_label = QLabel("Pump Speed:")
@@ -63,6 +207,7 @@ class LiquidCtlGUI(QMainWindow):
         self.pump_slider.setRange(0, 100)
         self.pump_slider.setValue(50)
         self.pump_slider.valueChanged.connect(self.adjust_pump_speed)
+        self.pump_slider.sliderReleased.connect(self.release_pump_slider)
         control_layout.addWidget(self.pump_slider)
 
         main_layout.addLayout(control_layout)
@@ -87,6 +232,8 @@ class LiquidCtlGUI(QMainWindow):
         # Log Output Section
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
+        # Keep only the most recent lines so the log doesn't grow forever
+        self.log_output.document().setMaximumBlockCount(self.log_max_lines)
         main_layout.addWidget(self.log_output)
 
         main_widget.setLayout(main_layout)
@@ -95,76 +242,79 @@ class LiquidCtlGUI(QMainWindow):
     def log_message(self, message):
         self.log_output.append(message)
 
+    def closeEvent(self, event):
+        # Send slider changes still waiting on their debounce timer
+        if self.fan_command_timer.isActive():
+            self.fan_command_timer.stop()
+            self.send_fan_speed_command()
+        if self.pump_command_timer.isActive():
+            self.pump_command_timer.stop()
+            self.send_pump_speed_command()
+        # Give already queued commands (e.g. a just released slider) a bounded time to finish
+        finished = self.command_pool.waitForDone(self.close_timeout)
+        if not finished:
+            self.command_pool.clear()
+            print("Warning: liquidctl commands still pending on exit were discarded", file=sys.stderr)
+        elif self.bridge is not None:
+            self.bridge.disconnect()
+        super().closeEvent(event)
+
+    def run_command(self, command, success_message, error_message, api_call=None):
+        worker = CommandWorker(command, success_message, error_message, self.bridge, api_call)
+        worker.signals.finished.connect(self.log_message)
+        self.command_pool.start(worker)
+
     def list_devices(self):
-        try:
-            result = subprocess.run(["liquidctl", "list"], capture_output=True, text=True, check=True)
-            self.log_message(f"Devices:\n{result.stdout}")
-        except FileNotFoundError:
-            self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error listing devices: {e.stderr}")
+        self.run_command(LIST_COMMAND, "Devices", "Error listing devices",
+                         lambda bridge: bridge.list_devices())
 
     def get_status(self):
-        try:
-            result = subprocess.run(["liquidctl", "status"], capture_output=True, text=True, check=True)
-            self.log_message(f"Status:\n{result.stdout}")
-        except FileNotFoundError:
-            self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error getting status: {e.stderr}")
+        self.run_command(STATUS_COMMAND, "Status", "Error getting status",
+                         lambda bridge: bridge.get_status())
 
     def adjust_fan_speed(self):
         speed = self.fan_slider.value()
-        fan_channel = "fan1"  # Replace with the appropriate fan channel for your setup
         self.fan_label.setText(f"Fan Speed: {speed}")  # Update label immediately
-        self.fan_command_timer.start(self.fan_adjustment_delay)
+        if not self.fan_slider.isSliderDown():  # While dragging, wait for release
+            self.fan_command_timer.start(self.slider_adjustment_delay)
+
+    def release_fan_slider(self):
+        self.fan_command_timer.stop()
+        self.send_fan_speed_command()
 
     def send_fan_speed_command(self):
         speed = self.fan_slider.value()
-        try:
-            result = subprocess.run(["liquidctl", "--match", "Corsair", "set", "fan1", "speed", str(speed)], capture_output=True, text=True, check=True)
-            self.log_message(f"Fan speed set to {speed}:\n{result.stdout}")
-        except FileNotFoundError:
-            self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error setting fan speed: {e.stderr}")
+        self.run_command([*FAN_SPEED_COMMAND, str(speed)],
+                         f"Fan speed set to {speed}", "Error setting fan speed",
+                         lambda bridge: bridge.set_fixed_speed(FAN_CHANNEL, speed))
 
     def adjust_pump_speed(self):
         speed = self.pump_slider.value()
         self.pump_label.setText(f"Pump Speed: {speed}")  # Update label immediately
-        self.pump_command_timer.start(self.pump_adjustment_delay)
+        if not self.pump_slider.isSliderDown():  # While dragging, wait for release
+            self.pump_command_timer.start(self.slider_adjustment_delay)
+
+    def release_pump_slider(self):
+        self.pump_command_timer.stop()
+        self.send_pump_speed_command()
 
     def send_pump_speed_command(self):
         speed = self.pump_slider.value()
-        try:
-            result = subprocess.run(["liquidctl", "--match", "Corsair", "set", "pump", "speed", str(speed)], capture_output=True, text=True, check=True)
-            self.log_message(f"Pump speed set to {speed}:\n{result.stdout}")
-        except FileNotFoundError:
-            self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error setting pump speed: {e.stderr}")
+        self.run_command([*PUMP_SPEED_COMMAND, str(speed)],
+                         f"Pump speed set to {speed}", "Error setting pump speed",
+                         lambda bridge: bridge.set_fixed_speed("pump", speed))
 
     def set_rgb_mode(self):
         mode = self.rgb_mode_combo.currentText()
-        try:
-            result = subprocess.run(["liquidctl", "set", "rgb", "mode", mode.lower()], capture_output=True, text=True, check=True)
-            self.log_message(f"RGB mode set to {mode}:\n{result.stdout}")
-        except FileNotFoundError:
-            self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error setting RGB mode: {e.stderr}")
+        self.run_command([*RGB_MODE_COMMAND, mode.lower()],
+                         f"RGB mode set to {mode}", "Error setting RGB mode")
 
     def set_rgb_color(self):
         color = QColorDialog.getColor()
         if color.isValid():
             r, g, b = color.red(), color.green(), color.blue()
-            try:
-                result = subprocess.run(["liquidctl", "set", "rgb", "color", str(r), str(g), str(b)], capture_output=True, text=True, check=True)
-                self.log_message(f"RGB color set to ({r}, {g}, {b}):\n{result.stdout}")
-            except FileNotFoundError:
-                self.log_message("Error: 'liquidctl' command not found. Please make sure it is installed.")
-            except subprocess.CalledProcessError as e:
-                self.log_message(f"Error setting RGB color: {e.stderr}")
+            self.run_command([*RGB_COLOR_COMMAND, str(r), str(g), str(b)],
+                             f"RGB color set to ({r}, {g}, {b})", "Error setting RGB color")
 
 def main():
     app = QApplication(sys.argv)